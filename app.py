@@ -1,11 +1,14 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session
+from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session, send_file, abort, make_response
+from werkzeug.http import is_resource_modified
 from werkzeug.utils import secure_filename
 import os
 import json
 import datetime
 import uuid
 import base64
+import hashlib
 import anthropic
+from PIL import Image
 from flask_wtf import FlaskForm
 from wtforms import StringField, FileField, TextAreaField, SelectField, SubmitField
 from wtforms.validators import DataRequired
@@ -15,19 +18,23 @@ from flask_login import LoginManager, UserMixin, login_user, login_required, log
 from werkzeug.security import generate_password_hash, check_password_hash
 
 # Import the CausalPromptEvaluator
-from causal_prompt_evaluator import CausalPromptEvaluator
+from causal_prompt_evaluator import CausalPromptEvaluator, VIDEO_EXTENSIONS, read_video_frame
 
 # Initialize Flask app
 app = Flask(__name__)
 app.config['SECRET_KEY'] = secrets.token_hex(16)
 app.config['UPLOAD_FOLDER'] = 'uploads'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max upload
+# Video uploads need far more than a frames ZIP; override with MAX_UPLOAD_MB
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_UPLOAD_MB', 512)) * 1024 * 1024
 app.config['TEMPLATES_AUTO_RELOAD'] = True
+app.config['THUMBNAIL_FOLDER'] = os.path.join('uploads', 'thumbnails')
+app.config['THUMBNAIL_SIZE'] = (320, 320)
 csrf = CSRFProtect(app)
 
 # Ensure upload directory exists
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'frames'), exist_ok=True)
+os.makedirs(app.config['THUMBNAIL_FOLDER'], exist_ok=True)
 os.makedirs('results', exist_ok=True)
 os.makedirs('prompts', exist_ok=True)
 
@@ -76,9 +83,133 @@ class EvaluationForm(FlaskForm):
         ('claude-3-opus-20240229', 'Claude 3 Opus'),
         ('claude-3-5-sonnet-20240620', 'Claude 3.5 Sonnet')
     ])
-    frames_folder = FileField('Upload Frames (ZIP)')
+    frames_folder = FileField('Upload Frames (ZIP) or Video')
     submit = SubmitField('Run Evaluation')
 
+# Listing cache
+# Parsed prompts/ and results/ listings are kept in memory until that directory's
+# generation counter is bumped by a write from this process, or its fingerprint
+# changes because something else (setup.py, save_evaluation, another worker,
+# a host edit on a mounted volume) wrote to it.
+CACHED_DIRS = ('prompts', 'results')
+
+cache_state = {
+    # Distinguishes ETags issued by this process from those of earlier runs or other workers
+    'boot_id': uuid.uuid4().hex,
+    'generations': {directory: 0 for directory in CACHED_DIRS},
+    'updated_at': {
+        directory: datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+        for directory in CACHED_DIRS
+    },
+    'entries': {}
+}
+
+def bump_cache_generation(directory):
+    """Invalidate a cached listing after a template or result is written or edited."""
+    cache_state['generations'][directory] += 1
+    # HTTP dates have one-second resolution
+    cache_state['updated_at'][directory] = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+    cache_state['entries'].pop(directory, None)
+
+def directory_fingerprint(directory):
+    """Return (json file count, newest mtime in ns) for a directory without reading any file."""
+    count = 0
+    newest = os.stat(directory).st_mtime_ns
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.endswith('.json'):
+                count += 1
+                newest = max(newest, entry.stat().st_mtime_ns)
+    return count, newest
+
+def load_json_dir(directory):
+    """Load every JSON document in a directory."""
+    documents = []
+    for filename in os.listdir(directory):
+        if filename.endswith('.json'):
+            with open(os.path.join(directory, filename), 'r') as f:
+                documents.append(json.load(f))
+    return documents
+
+def cached_json_dir(directory):
+    """Return the parsed contents of a directory, reusing them until it changes."""
+    fingerprint = directory_fingerprint(directory)
+    entries = cache_state['entries']
+    if directory not in entries or entries[directory][0] != fingerprint:
+        entries[directory] = (fingerprint, load_json_dir(directory))
+    return entries[directory][1]
+
+def cached_view(render, *variant, dirs):
+    """Serve a listing view with an ETag, answering 304 when it still matches.
+
+    ``dirs`` names the cached directories the view reads; writes elsewhere do
+    not invalidate it. ``variant`` holds anything else that affects the output.
+    """
+    # Pending flash messages are rendered into the page, so it must not be reused
+    if session.get('_flashes'):
+        return render()
+    
+    fingerprints = tuple(
+        (directory, cache_state['generations'][directory], directory_fingerprint(directory))
+        for directory in dirs
+    )
+    etag = hashlib.sha1(
+        f"{cache_state['boot_id']}:{fingerprints}:{current_user.get_id()}:{variant}".encode('utf-8')
+    ).hexdigest()
+    
+    # Decide on the ETag alone: Last-Modified has one-second resolution, so an
+    # If-Modified-Since check would miss writes made in the same second
+    if not is_resource_modified(request.environ, etag=etag):
+        response = make_response('', 304)
+    else:
+        response = make_response(render())
+    
+    response.set_etag(etag)
+    response.last_modified = max(
+        max(cache_state['updated_at'][directory],
+            datetime.datetime.fromtimestamp(newest / 1e9, datetime.timezone.utc).replace(microsecond=0))
+        for directory, _, (_, newest) in fingerprints
+    )
+    # Per-user pages: browsers may keep them but must revalidate on each use
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+# Thumbnail cache
+def thumbnail_key(source_path, frame_id):
+    """Address a thumbnail by its source file's fingerprint and the frame within it."""
+    stat = os.stat(source_path)
+    fingerprint = f"{os.path.abspath(source_path)}:{stat.st_size}:{stat.st_mtime_ns}:{frame_id}:{app.config['THUMBNAIL_SIZE']}"
+    return hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()
+
+def build_thumbnail(source_path, frame_id, thumb_path):
+    """Render a JPEG thumbnail of a frame image or of a video frame at frame_id seconds."""
+    # Write to a temporary file first so concurrent requests never see a partial thumbnail
+    tmp_path = f"{thumb_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        if source_path.lower().endswith(VIDEO_EXTENSIONS):
+            frame = read_video_frame(source_path, float(frame_id))
+            if frame is None:
+                return False
+            thumbnail = Image.fromarray(frame).convert('RGB')
+        else:
+            with Image.open(source_path) as image:
+                # Let the JPEG decoder downscale while reading instead of decoding full size
+                image.draft('RGB', app.config['THUMBNAIL_SIZE'])
+                thumbnail = image.convert('RGB')
+        
+        thumbnail.thumbnail(app.config['THUMBNAIL_SIZE'])
+        thumbnail.save(tmp_path, 'JPEG', quality=85)
+        os.replace(tmp_path, thumb_path)
+        return True
+    
+    except (OSError, ValueError) as e:
+        # Covers unreadable or corrupt frames (UnidentifiedImageError is an OSError)
+        print(f"Error building thumbnail for {source_path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+
 # Routes
 @app.route('/')
 def index():
@@ -110,19 +241,20 @@ def logout():
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    # Get count of saved templates
-    template_count = len([f for f in os.listdir('prompts') if f.endswith('.json')])
-    
-    # Get count of completed evaluations
-    eval_count = len([f for f in os.listdir('results') if f.endswith('.json')])
-    
     # Check if API key is set
     api_key_set = current_user.api_key is not None
     
-    return render_template('dashboard.html', 
-                          template_count=template_count,
-                          eval_count=eval_count,
-                          api_key_set=api_key_set)
+    def render():
+        # Get counts of saved templates and completed evaluations
+        template_count = len(cached_json_dir('prompts'))
+        eval_count = len(cached_json_dir('results'))
+        
+        return render_template('dashboard.html', 
+                              template_count=template_count,
+                              eval_count=eval_count,
+                              api_key_set=api_key_set)
+    
+    return cached_view(render, api_key_set, dirs=CACHED_DIRS)
 
 @app.route('/api-key', methods=['GET', 'POST'])
 @login_required
@@ -142,14 +274,10 @@ def api_key():
 @app.route('/prompt-templates')
 @login_required
 def prompt_templates():
-    templates = []
-    for filename in os.listdir('prompts'):
-        if filename.endswith('.json'):
-            with open(os.path.join('prompts', filename), 'r') as f:
-                template = json.load(f)
-                templates.append(template)
+    def render():
+        return render_template('prompt_templates.html', templates=cached_json_dir('prompts'))
     
-    return render_template('prompt_templates.html', templates=templates)
+    return cached_view(render, dirs=('prompts',))
 
 @app.route('/prompt-templates/new', methods=['GET', 'POST'])
 @login_required
@@ -167,6 +295,7 @@ def new_template():
         filename = f"{template['id']}.json"
         with open(os.path.join('prompts', filename), 'w') as f:
             json.dump(template, f, indent=2)
+        bump_cache_generation('prompts')
         
         flash('Template saved successfully')
         return redirect(url_for('prompt_templates'))
@@ -195,6 +324,7 @@ def edit_template(template_id):
         
         with open(template_path, 'w') as f:
             json.dump(template, f, indent=2)
+        bump_cache_generation('prompts')
         
         flash('Template updated successfully')
         return redirect(url_for('prompt_templates'))
@@ -209,17 +339,13 @@ def edit_template(template_id):
 @app.route('/evaluations')
 @login_required
 def evaluations():
-    evaluations = []
-    for filename in os.listdir('results'):
-        if filename.endswith('.json'):
-            with open(os.path.join('results', filename), 'r') as f:
-                eval_data = json.load(f)
-                evaluations.append(eval_data)
-    
-    # Sort by timestamp, newest first
-    evaluations.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
+    def render():
+        # Sort by timestamp, newest first (copy so the cached listing is left untouched)
+        evaluations = sorted(cached_json_dir('results'), key=lambda x: x.get('timestamp', ''), reverse=True)
+        
+        return render_template('evaluations.html', evaluations=evaluations)
     
-    return render_template('evaluations.html', evaluations=evaluations)
+    return cached_view(render, dirs=('results',))
 
 @app.route('/evaluations/<eval_id>')
 @login_required
@@ -235,6 +361,55 @@ def view_evaluation(eval_id):
     
     return render_template('view_evaluation.html', evaluation=evaluation)
 
+@app.route('/evaluations/<eval_id>/frames/<int:index>/thumbnail')
+@login_required
+def frame_thumbnail(eval_id, index):
+    eval_path = os.path.join('results', f"{secure_filename(eval_id)}.json")
+    
+    if not os.path.exists(eval_path):
+        abort(404)
+    
+    with open(eval_path, 'r') as f:
+        evaluation = json.load(f)
+    
+    frames = evaluation.get('frames', [])
+    if index >= len(frames):
+        abort(404)
+    frame = frames[index]
+    
+    # Videos are a single file; frame directories hold one image per frame
+    frames_path = evaluation.get('frames_path', '')
+    if os.path.isfile(frames_path):
+        source_path = frames_path
+    else:
+        source_path = os.path.join(frames_path, os.path.basename(frame['filename']))
+    
+    if not os.path.isfile(source_path):
+        abort(404)
+    
+    key = thumbnail_key(source_path, frame['frame_id'])
+    thumb_path = os.path.join(app.config['THUMBNAIL_FOLDER'], f"{key}.jpg")
+    # Frames that could not be thumbnailed are remembered, so broken sources
+    # are not re-decoded on every view; the key changes if the source does
+    failed_path = os.path.join(app.config['THUMBNAIL_FOLDER'], f"{key}.failed")
+    
+    if os.path.exists(failed_path):
+        abort(404)
+    
+    # Only touch the full-size source the first time this thumbnail is requested
+    if not os.path.exists(thumb_path):
+        if not build_thumbnail(source_path, frame['frame_id'], thumb_path):
+            open(failed_path, 'w').close()
+            abort(404)
+    
+    # send_file answers If-None-Match / If-Modified-Since with 304 itself
+    response = send_file(os.path.abspath(thumb_path), mimetype='image/jpeg', etag=key,
+                         conditional=True, max_age=86400)
+    # Thumbnails sit behind login, so keep them out of shared caches
+    response.cache_control.public = False
+    response.cache_control.private = True
+    return response
+
 @app.route('/new-evaluation', methods=['GET', 'POST'])
 @login_required
 def new_evaluation():
@@ -246,14 +421,7 @@ def new_evaluation():
     form = EvaluationForm()
     
     # Populate template choices
-    templates = []
-    for filename in os.listdir('prompts'):
-        if filename.endswith('.json'):
-            with open(os.path.join('prompts', filename), 'r') as f:
-                template = json.load(f)
-                templates.append((template['id'], template['name']))
-    
-    form.template.choices = templates
+    form.template.choices = [(t['id'], t['name']) for t in cached_json_dir('prompts')]
     
     if form.validate_on_submit():
         # Process the frames (in a real app, handle ZIP extraction)
@@ -266,19 +434,34 @@ def new_evaluation():
         with open(template_path, 'r') as f:
             template = json.load(f)
         
+        # Take the extension from the raw name: secure_filename drops non-ASCII
+        # characters and can strip the dot along with them
+        upload = form.frames_folder.data
+        video_ext = None
+        if upload and upload.filename:
+            video_ext = os.path.splitext(upload.filename)[1].lower()
+            if video_ext not in VIDEO_EXTENSIONS:
+                flash(f"Unsupported upload '{upload.filename}'. Please upload a video file "
+                      f"({', '.join(VIDEO_EXTENSIONS)}).")
+                return redirect(url_for('new_evaluation'))
+        
         # Create a unique ID for this evaluation
         eval_id = str(uuid.uuid4())
         eval_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'frames', eval_id)
         os.makedirs(eval_dir, exist_ok=True)
         
-        # In a real app, handle file uploads properly
-        # For now, we'll assume the frames are already in the directory
+        # Video uploads are decoded directly by the evaluator; otherwise
+        # we assume the frames are already in the directory
+        frames_source = eval_dir
+        if video_ext:
+            frames_source = os.path.join(eval_dir, f"video{video_ext}")
+            upload.save(frames_source)
         
         # Initialize the evaluator
         evaluator = CausalPromptEvaluator(current_user.api_key)
         
         # Run the evaluation
-        evaluation = evaluator.run_full_evaluation(eval_dir)
+        evaluation = evaluator.run_full_evaluation(frames_source)
         
         # Add additional metadata
         evaluation['id'] = eval_id
@@ -289,6 +472,7 @@ def new_evaluation():
         # Save the evaluation results
         with open(os.path.join('results', f"{eval_id}.json"), 'w') as f:
             json.dump(evaluation, f, indent=2)
+        bump_cache_generation('results')
         
         flash('Evaluation completed successfully')
         return redirect(url_for('view_evaluation', eval_id=eval_id))
@@ -298,26 +482,12 @@ def new_evaluation():
 @app.route('/api/templates')
 @login_required
 def api_templates():
-    templates = []
-    for filename in os.listdir('prompts'):
-        if filename.endswith('.json'):
-            with open(os.path.join('prompts', filename), 'r') as f:
-                template = json.load(f)
-                templates.append(template)
-    
-    return jsonify(templates)
+    return cached_view(lambda: jsonify(cached_json_dir('prompts')), dirs=('prompts',))
 
 @app.route('/api/evaluations')
 @login_required
 def api_evaluations():
-    evaluations = []
-    for filename in os.listdir('results'):
-        if filename.endswith('.json'):
-            with open(os.path.join('results', filename), 'r') as f:
-                evaluation = json.load(f)
-                evaluations.append(evaluation)
-    
-    return jsonify(evaluations)
+    return cached_view(lambda: jsonify(cached_json_dir('results')), dirs=('results',))
 
 if __name__ == '__main__':
     app.run(debug=True)
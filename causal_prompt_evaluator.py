@@ -1,5 +1,6 @@
 import anthropic
 import base64
+import cv2
 import os
 import re
 import json
@@ -8,6 +9,39 @@ import time
 import uuid
 from typing import List, Dict, Any, Optional, Tuple
 
+# Video containers that can be passed to get_frames instead of a frames directory
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi', '.mkv', '.webm')
+
+
+def seek_video_frame(capture, timestamp: float):
+    """Seek an open capture to a timestamp (in seconds) and decode that one frame.
+
+    Seeking means intermediate frames are never decoded. Returns the frame as a
+    BGR array, or None if the seek or decode failed.
+    """
+    capture.set(cv2.CAP_PROP_POS_MSEC, timestamp * 1000.0)
+    ok, frame = capture.read()
+    return frame if ok else None
+
+
+def read_video_frame(video_path: str, timestamp: float):
+    """Decode the single frame of a video at the given timestamp (in seconds).
+
+    Returns the frame as an RGB array, or None if it could not be decoded.
+    """
+    capture = cv2.VideoCapture(video_path)
+    try:
+        if not capture.isOpened():
+            print(f"Could not open video {video_path}")
+            return None
+        frame = seek_video_frame(capture, timestamp)
+        if frame is None:
+            print(f"Could not decode frame at {timestamp}s of {video_path}")
+            return None
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    finally:
+        capture.release()
+
 class CausalPromptEvaluator:
     def __init__(self, api_key: str):
         """Initialize with Claude API key."""
@@ -36,8 +70,71 @@ class CausalPromptEvaluator:
             print(f"Error encoding image {image_path}: {e}")
             return None
 
+    def encode_video_frame(self, frame) -> str:
+        """Encode a decoded video frame to base64 JPEG without writing it to disk."""
+        try:
+            ok, buffer = cv2.imencode('.jpg', frame)
+            if not ok:
+                print("Error encoding video frame: JPEG encoding failed")
+                return None
+            return base64.b64encode(buffer.tobytes()).decode("utf-8")
+        except Exception as e:
+            print(f"Error encoding video frame: {e}")
+            return None
+
+    def get_video_frames(self, video_path: str, max_frames: int = 20) -> List[Dict[str, Any]]:
+        """Decode only the selected frames of a video by seeking to their timestamps."""
+        capture = cv2.VideoCapture(video_path)
+        try:
+            if not capture.isOpened():
+                print(f"Could not open video {video_path}")
+                return []
+
+            fps = capture.get(cv2.CAP_PROP_FPS)
+            frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+            if fps <= 0 or frame_count <= 0:
+                print(f"Could not determine frame rate or length of {video_path}")
+                return []
+
+            # Spread the samples across the whole duration; seeking makes any spacing cheap
+            if frame_count > max_frames:
+                selected_indices = [i * frame_count // max_frames for i in range(max_frames)]
+            else:
+                selected_indices = list(range(frame_count))
+
+            video_name = os.path.basename(video_path)
+            processed_frames = []
+            for index in selected_indices:
+                # Seek to the recorded timestamp so read_video_frame finds the same frame later
+                timestamp = round(index / fps, 3)
+                frame = seek_video_frame(capture, timestamp)
+                if frame is None:
+                    print(f"Skipping frame at {timestamp}s of {video_name}: seek or decode failed")
+                    continue
+
+                encoded_content = self.encode_video_frame(frame)
+                if encoded_content:
+                    processed_frames.append({
+                        "frame_id": timestamp,
+                        "filename": video_name,
+                        "content": encoded_content
+                    })
+                else:
+                    print(f"Skipping frame at {timestamp}s of {video_name} due to encoding error")
+
+            return processed_frames
+
+        except Exception as e:
+            print(f"Error in video frame processing: {e}")
+            return []
+        finally:
+            capture.release()
+
     def get_frames(self, frames_dir: str, max_frames: int = 20) -> List[Dict[str, Any]]:
-        """Extract and process frames."""
+        """Extract and process frames from a frames directory or a video file."""
+        if os.path.isfile(frames_dir) and frames_dir.lower().endswith(VIDEO_EXTENSIONS):
+            return self.get_video_frames(frames_dir, max_frames)
+
         try:
             # Get all frame files from the directory
             frame_files = [f for f in os.listdir(frames_dir) if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
@@ -217,6 +314,11 @@ class CausalPromptEvaluator:
             "timestamp": timestamp,
             "frames_analyzed": len(frames),
             "frames_path": frames_dir,
+            # Record exactly which frames were sent, without their content
+            "frames": [
+                {"frame_id": frame["frame_id"], "filename": frame["filename"]}
+                for frame in frames
+            ],
             "template_id": template_id,
             "model": model,
             "results": evaluation_results